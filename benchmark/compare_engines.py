@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+"""
+This script is a differential test and benchmark harness for the periodicity engines. It runs
+the reference engine and every other engine in `periodicity.ENGINES` on the same inputs, asserts
+that the frame triples and the pattern assignments of `graph_periodicity.py` are exactly equal,
+and reports the speedup of each engine.
+
+Stages
+------
+transcript   : per-transcript frame triples (periodicity_per_transcript vs frame_matrix)
+read_length  : periodicity summed over all transcripts of a read length, timed
+study_level  : pattern assignments of get_periodicity_study_level
+sample_level : pattern assignments of get_periodicity_sample_level
+
+Only the read_length stage depends on the engine's speed, the other stages only check equality.
+frame_matrix is shared by the engines, so the transcript stage is ran once; the graph aggregations
+are the same code for every engine and are ran on each engine's periodicity result.
+
+Inputs
+------
+Synthetic coverage is always used; it includes CDS regions that are not a multiple of 3,
+transcripts without coverage, CDS regions running past the end of the coverage array and counts
+close to the int32 limit. Real inputs are used when a ribo file is given, ex.
+
+    python benchmark/compare_engines.py --ribo ribobase/GSExxxxx_dedup/ribo/experiments/GSMxxxxx.ribo \
+        --start-stop start_stop_sites/mouse_start_stop.json --read-lengths 28 32
+
+Known differences
+-----------------
+The reference engine filters transcripts with a Python sum of the int32 counts, which can overflow
+and wrap around to exactly 0; the reference then drops the transcript while the vectorized engine
+(int64) keeps it. This case is left out of the synthetic inputs and reported separately, it does
+not count as a mismatch.
+"""
+
+# the scripts live in the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import periodicity
+import graph_periodicity
+
+
+
+def make_synthetic_start_stop(num_transcripts, max_codons, seed):
+    """
+    Generate the synthetic CDS start and stop sites along with the length of each transcript
+
+    Parameters
+    ----------
+    num_transcripts (int)
+        Number of transcripts to generate
+    max_codons (int)
+        Maximum CDS length in codons
+    seed (int)
+        Seed for the random number generator
+
+    Returns
+    -------
+    (start_and_stop, lengths) (tuple (dict, dict))
+        start_and_stop has the same format as the ./start_stop_sites results
+    """
+    rng = np.random.default_rng(seed)
+    start_and_stop = dict()
+    lengths = dict()
+    for index in range(num_transcripts):
+        transcript = f"transcript_{index}"
+        utr5, utr3 = (int(x) for x in rng.integers(0, 60, size=2))
+        cds_length = 3 * int(rng.integers(1, max_codons + 1))
+        if index % 10 == 0:
+            # CDS length not a multiple of 3
+            cds_length += int(rng.integers(1, 3))
+        elif index % 10 == 1:
+            # CDS running past the end of the coverage array
+            utr3 = -int(rng.integers(1, 3))
+        start_and_stop[transcript] = [utr5, utr5 + cds_length]
+        lengths[transcript] = utr5 + cds_length + utr3
+    return start_and_stop, lengths
+
+
+
+def make_synthetic_coverage(start_and_stop, lengths, seed):
+    """
+    Generate synthetic coverage data for one read length
+
+    Parameters
+    ----------
+    start_and_stop (dict)
+        Synthetic start and stop sites from make_synthetic_start_stop
+    lengths (dict)
+        Synthetic transcript lengths from make_synthetic_start_stop
+    seed (int)
+        Seed for the random number generator
+
+    Returns
+    -------
+    coverage (dict)
+        Same format as the ribo_object coverage data
+    """
+    rng = np.random.default_rng(seed)
+    coverage = dict()
+    for index, (transcript, length) in enumerate(lengths.items()):
+        if index % 10 == 2:
+            transcript_coverage = np.zeros(length, dtype=np.int32)
+        elif index % 10 == 3:
+            # counts close to the int32 limit
+            transcript_coverage = rng.integers(2**30, 2**31 - 1, size=length, dtype=np.int32)
+        else:
+            transcript_coverage = rng.poisson(rng.uniform(0, 3), size=length).astype(np.int32)
+            # frame bias, as seen in ribosome profiling data
+            transcript_coverage[start_and_stop[transcript][0]::3] *= 3
+        coverage[transcript] = transcript_coverage
+    return coverage
+
+
+
+def report_known_differences():
+    """
+    Run every engine on the known differences, see the module docstring, and print the results.
+    Currently only one codon whose int32 sum wraps around to exactly 0:
+    (2**31 - 1) + (2**31 - 1) + 2 == 2**32
+    """
+    coverage = {"transcript_overflow": np.array([2**31 - 1, 2**31 - 1, 2], dtype=np.int32)}
+    start_and_stop = {"transcript_overflow": [0, 3]}
+
+    print("known difference: CDS whose int32 sum wraps around to 0 (not counted as a mismatch)")
+    # the overflow is the point of this input
+    with np.errstate(over="ignore"):
+        reference_result = periodicity.ENGINES["reference"](coverage, start_and_stop)
+        for engine_name, engine in periodicity.ENGINES.items():
+            result = engine(coverage, start_and_stop)
+            status = "same as reference" if result == reference_result else "differs from reference"
+            print(f"{engine_name:<14}{str(result):<32}{status}")
+    print()
+
+
+
+def load_ribo_coverage(ribo_path, read_lengths):
+    """
+    Load the coverage data of a ribo file for each read length, in the same way as periodicity.py
+
+    Parameters
+    ----------
+    ribo_path (str)
+        Path to the ribo file, the experiment name is the file name without .ribo
+    read_lengths (array (int))
+        Read lengths to load
+
+    Returns
+    -------
+    coverages (dict)
+        Maps read length to the ribo_object coverage data
+    """
+    import ribopy
+
+    exp_name = os.path.basename(ribo_path)[:-5]
+    ribo_object = ribopy.Ribo(ribo_path, alias=None)
+    coverages = dict()
+    for read_length in read_lengths:
+        coverages[read_length] = ribo_object.get_coverage(
+            experiment=exp_name,
+            alias=False,
+            range_lower=read_length,
+            range_upper=read_length
+        )
+    return coverages
+
+
+
+def timed(function, *args, repeats=1):
+    """
+    Run a function and return its result along with the best running time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+
+def reference_transcript_triples(coverage, start_and_stop):
+    """
+    Per-transcript frame triples of the transcripts kept by the reference engine
+    """
+    return [
+        periodicity.periodicity_per_transcript(cds_coverage)
+        for cds_coverage in periodicity.reference_cds_coverages(coverage, start_and_stop)
+    ]
+
+
+
+def build_result(coverages, start_and_stop, engine, samples_per_study):
+    """
+    Build a periodicity result with the format stated in the README.md from the given coverages.
+    Every coverage is treated as one sample and samples are grouped into studies; the read
+    lengths are stored as str, like after loading the result from ./result
+    """
+    result = dict()
+    for index, (sample, sample_coverages) in enumerate(coverages.items()):
+        study = f"GSE{index // samples_per_study:05d}_dedup"
+        result.setdefault(study, dict())[sample] = {
+            str(read_length): engine(coverage, start_and_stop)
+            for read_length, coverage in sample_coverages.items()
+        }
+    return result
+
+
+
+def compare_stage(report, stage, engine_name, reference, candidate, equal, timing=None):
+    """
+    Record whether the candidate matches the reference exactly, along with the (reference time,
+    candidate time) timing of the stage if it is timed
+    """
+    matched = equal(reference, candidate)
+    if timing is None:
+        report.append((stage, engine_name, None, None, None, matched))
+    else:
+        reference_time, candidate_time = timing
+        speedup = reference_time / candidate_time if candidate_time > 0 else float("inf")
+        report.append((stage, engine_name, reference_time, candidate_time, speedup, matched))
+    return matched
+
+
+
+def same_sample_level(reference, candidate):
+    """
+    Whether two results of get_periodicity_sample_level have the same pattern assignments
+    """
+    return all(
+        reference[pattern]["sum"] == candidate[pattern]["sum"] and
+        np.array_equal(reference[pattern]["periodicty_count"], candidate[pattern]["periodicty_count"])
+        for pattern in reference
+    )
+
+
+
+def run(coverages, start_and_stop, threshold, repeats, samples_per_study):
+    """
+    Run every engine against the reference engine on the given coverages
+
+    Parameters
+    ----------
+    coverages (dict)
+        Maps sample name to a dict which maps read length to the ribo_object coverage data
+    start_and_stop (dict)
+        Contains the start and stop site for each gene's CDS region
+    threshold (int/float)
+        Threshold value which used to separate the periodicty result into different patterns
+    repeats (int)
+        Number of times the read_length stage is timed, the best time is reported
+    samples_per_study (int)
+        Number of samples grouped into one study for the study level stage
+
+    Returns
+    -------
+    report (array (tuple))
+        (stage, engine, reference time, engine time, speedup, matched) for each stage and engine,
+        the times and speedup are None for the stages that are not timed
+    """
+    reference_engine = periodicity.ENGINES["reference"]
+    all_coverages = [coverage for sample in coverages.values() for coverage in sample.values()]
+
+    reference_read_length = timed(
+        lambda: [reference_engine(c, start_and_stop) for c in all_coverages], repeats=repeats
+    )
+    reference_result = build_result(coverages, start_and_stop, reference_engine, samples_per_study)
+    reference_study_level = graph_periodicity.get_periodicity_study_level(reference_result, threshold)
+    reference_sample_level = graph_periodicity.get_periodicity_sample_level(reference_result, threshold)
+
+    report = []
+    compare_stage(
+        report,
+        "transcript",
+        "frame_matrix",
+        [reference_transcript_triples(c, start_and_stop) for c in all_coverages],
+        [periodicity.frame_matrix(c, start_and_stop).tolist() for c in all_coverages],
+        lambda x, y: x == y
+    )
+    for engine_name, engine in periodicity.ENGINES.items():
+        if engine_name == "reference":
+            continue
+        candidate_read_length = timed(
+            lambda: [engine(c, start_and_stop) for c in all_coverages], repeats=repeats
+        )
+        compare_stage(report, "read_length", engine_name, reference_read_length[0], candidate_read_length[0],
+                      lambda x, y: x == y, timing=(reference_read_length[1], candidate_read_length[1]))
+
+        # the graph aggregations are the same code, but run on the engine's periodicity result
+        candidate_result = build_result(coverages, start_and_stop, engine, samples_per_study)
+        candidate_study_level = graph_periodicity.get_periodicity_study_level(candidate_result, threshold)
+        compare_stage(report, "study_level", engine_name, reference_study_level, candidate_study_level,
+                      lambda x, y: x == y)
+        candidate_sample_level = graph_periodicity.get_periodicity_sample_level(candidate_result, threshold)
+        compare_stage(report, "sample_level", engine_name, reference_sample_level, candidate_sample_level,
+                      same_sample_level)
+    return report
+
+
+
+def print_report(title, report):
+    """
+    Print the timing and comparison result of each stage and engine
+    """
+    print(title)
+    print(f"{'stage':<14}{'engine':<14}{'reference (s)':>15}{'engine (s)':>13}{'speedup':>10}  result")
+    for stage, engine_name, reference_time, candidate_time, speedup, matched in report:
+        if speedup is None:
+            timing = f"{'-':>15}{'-':>13}{'-':>10}"
+        else:
+            timing = f"{reference_time:>15.4f}{candidate_time:>13.4f}{speedup:>9.2f}x"
+        print(f"{stage:<14}{engine_name:<14}{timing}  {'ok' if matched else 'MISMATCH'}")
+    print()
+
+
+
+### main
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the periodicity engines against the reference engine")
+    parser.add_argument("--samples", type=int, default=8, help="number of synthetic samples")
+    parser.add_argument("--transcripts", type=int, default=2000, help="number of synthetic transcripts")
+    parser.add_argument("--max-codons", type=int, default=600, help="maximum synthetic CDS length in codons")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--ribo", help="ribo file used as real input")
+    parser.add_argument("--start-stop", help="start and stop sites json for the ribo file")
+    parser.add_argument("--read-lengths", type=int, nargs=2, default=[28, 32], metavar=("START", "STOP"))
+    args = parser.parse_args()
+
+    all_matched = True
+
+    # synthetic inputs, every sample and read length has its own coverage
+    start_and_stop, lengths = make_synthetic_start_stop(args.transcripts, args.max_codons, args.seed)
+    coverages = dict()
+    for sample in range(args.samples):
+        coverages[f"GSM{sample:05d}"] = {
+            read_length: make_synthetic_coverage(start_and_stop, lengths, args.seed + sample * 100 + read_length)
+            for read_length in range(25, 28)
+        }
+    report = run(coverages, start_and_stop, args.threshold, args.repeats, samples_per_study=3)
+    print_report("synthetic inputs", report)
+    all_matched &= all(row[-1] for row in report)
+    report_known_differences()
+
+    # real inputs
+    if args.ribo:
+        if not args.start_stop:
+            parser.error("--start-stop is required with --ribo")
+        with open(args.start_stop, 'r') as j_file:
+            start_and_stop = json.load(j_file)
+        read_lengths = range(args.read_lengths[0], args.read_lengths[1] + 1)
+        coverages = {os.path.basename(args.ribo)[:-5]: load_ribo_coverage(args.ribo, read_lengths)}
+        report = run(coverages, start_and_stop, args.threshold, args.repeats, samples_per_study=1)
+        print_report(f"real inputs ({args.ribo})", report)
+        all_matched &= all(row[-1] for row in report)
+
+    if not all_matched:
+        print("Error: an engine does not match the reference engine")
+        sys.exit(1)
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+This script measures the startup time of the command line entry point, which matters when the
+pipeline is launched as hundreds of short array jobs. Each command is ran several times in a new
+interpreter and the best wall time is reported, along with a bare interpreter for reference.
+Besides `--help`, which stops in argparse, a real `cli.py merge` of two small results (with
+their frame statistics) in a temporary directory is timed, as ran by the array jobs. Commands
+that fail, ex. because a dependency is not installed, are reported as failed.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "python": [sys.executable, "-c", "pass"],
+    "cli.py --help": [sys.executable, "cli.py", "--help"],
+    "cli.py merge --help": [sys.executable, "cli.py", "merge", "--help"],
+    "cli.py compute --help": [sys.executable, "cli.py", "compute", "--help"],
+    "import periodicity": [sys.executable, "-c", "import periodicity"],
+    "import graph_periodicity": [sys.executable, "-c", "import graph_periodicity"],
+}
+
+
+
+def startup_time(command, repeats):
+    """
+    Run a command in the root of the repository and return its best wall time in seconds, or
+    None if the command failed
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            return None
+        best = min(best, elapsed)
+    return best
+
+
+
+def write_merge_inputs(directory):
+    """
+    Write two small periodicity results and their frame statistics for timing `cli.py merge`,
+    returns the merge command
+    """
+    inputs = []
+    for index in range(2):
+        study = f"GSE{index:05d}_dedup"
+        result = {study: {f"GSM{index:05d}": {"28": [3, 2, 1]}}}
+        stats = {study: {f"GSM{index:05d}": {"28": {
+            "num_transcripts": 1,
+            "frame_fractions": [0.5, 0.33, 0.17],
+            "ci_lower": [0.5, 0.33, 0.17],
+            "ci_upper": [0.5, 0.33, 0.17]
+        }}}}
+        input_path = os.path.join(directory, f"part_{index}.json")
+        with open(input_path, 'w') as json_f:
+            json.dump(result, json_f)
+        with open(os.path.join(directory, f"part_{index}_stats.json"), 'w') as json_f:
+            json.dump(stats, json_f)
+        inputs.append(input_path)
+    return [sys.executable, "cli.py", "merge", os.path.join(directory, "merged.json")] + inputs
+
+
+
+### main
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the startup time of the command line entry point")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        commands = dict(COMMANDS)
+        commands["cli.py merge (2 files)"] = write_merge_inputs(directory)
+
+        print(f"{'command':<28}{'best (s)':>10}")
+        for name, command in commands.items():
+            elapsed = startup_time(command, args.repeats)
+            print(f"{name:<28}{'failed' if elapsed is None else f'{elapsed:.4f}':>10}")
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import sys
+
+from result_files import get_stats_file_path
+
+"""
+Command line entry point for the periodicity pipeline, ran from the root of the repository.
+
+Subcommands
+-----------
+scan    : separate the studies in ./ribobase by species and QC status (./studies_lists/studies.json)
+compute : calculate the periodicity and frame statistics of the studies (./result)
+merge   : merge periodicity results, ex. the outputs of array jobs that each computed a few studies
+plot    : graph the periodicity results
+
+Heavy dependencies (numpy, ribopy, matplotlib) are only imported inside the subcommand that needs
+them, so short jobs and `--help` start quickly. Ex. running one study per array job:
+
+    python cli.py compute --species human --qc passed --studies GSExxxxx_dedup \
+        --output ./result/parts/GSExxxxx_dedup.json
+    python cli.py merge ./result/human_passed_periodicity.json ./result/parts/*.json
+"""
+
+SPECIES = ["human", "mouse"]
+QC_STATUSES = ["passed", "failed"]
+
+
+
+def QC_results(args):
+    """
+    Convert the --qc argument into the QC results used in the file names, ex. "_passed_"
+    """
+    return [f"_{QC}_" for QC in args.qc]
+
+
+
+def merge_result_files(output_path, input_paths):
+    """
+    Merge periodicity results at the study level and save them to output_path. If output_path
+    already exists, its studies are kept; studies in later input files replace earlier ones
+
+    Parameters
+    ----------
+    output_path (str)
+        Path of the merged result
+    input_paths (array (str))
+        Paths of the results to be merged
+    """
+    merged = dict()
+    for path in [output_path] + input_paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as j_file:
+            merged.update(json.load(j_file))
+    with open(output_path, 'w') as json_f:
+        json.dump(merged, json_f, indent=4)
+
+
+
+def scan(args):
+    from studies_lists.separate_studies import separate_studies
+
+    # only the selected species and QC statuses are replaced, the others are kept
+    studies_path = "./studies_lists/studies.json"
+    result = dict()
+    if os.path.exists(studies_path):
+        with open(studies_path, 'r') as j_file:
+            result = json.load(j_file)
+    result.update(separate_studies(args.species, QC_results(args)))
+    with open(studies_path, 'w') as j_file:
+        json.dump(result, j_file, indent=4)
+
+
+
+def compute(args):
+    import multiprocessing
+    import periodicity
+
+    if args.engine not in periodicity.ENGINES:
+        print(f"Error: Unknown engine '{args.engine}', choose from {list(periodicity.ENGINES)}")
+        sys.exit(1)
+    if args.output and len(args.species) * len(args.qc) != 1:
+        print("Error: --output requires a single --species and --qc")
+        sys.exit(1)
+
+    main_manager = multiprocessing.Manager()
+    manager_lock = main_manager.Lock()
+    for species in args.species:
+        for QC in QC_results(args):
+            periodicity.compute_periodicity(
+                species,
+                QC,
+                main_manager,
+                manager_lock,
+                engine=args.engine,
+                num_bootstrap=args.num_bootstrap,
+                studies=args.studies,
+                output_file_path=args.output,
+                compute_stats=not args.no_stats
+            )
+    main_manager.shutdown()
+
+
+
+def merge(args):
+    merge_result_files(args.output, args.inputs)
+    # the frame statistics of each result are merged the same way
+    stats_inputs = [get_stats_file_path(path) for path in args.inputs if os.path.exists(get_stats_file_path(path))]
+    if stats_inputs:
+        merge_result_files(get_stats_file_path(args.output), stats_inputs)
+
+
+
+def plot(args):
+    import graph_periodicity
+
+    if args.level == "study":
+        graph_periodicity.graph_periodicity_all_studies(args.species, QC_results(args), args.num_cols, args.threshold)
+    else:
+        graph_periodicity.graph_periodicity_sample_level(args.species, QC_results(args), args.threshold)
+
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Periodicity check for the ribosome profiling samples in RiboBase")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_species_and_QC(subparser):
+        subparser.add_argument("--species", nargs="+", choices=SPECIES, default=SPECIES)
+        subparser.add_argument("--qc", nargs="+", choices=QC_STATUSES, default=QC_STATUSES)
+
+    scan_parser = subparsers.add_parser("scan", help="separate the studies by species and QC status")
+    add_species_and_QC(scan_parser)
+    scan_parser.set_defaults(func=scan)
+
+    compute_parser = subparsers.add_parser("compute", help="calculate the periodicity of the studies")
+    add_species_and_QC(compute_parser)
+    compute_parser.add_argument("--engine", default="reference", help="engine used to sum up the periodicity")
+    compute_parser.add_argument("--num-bootstrap", type=int, default=1000,
+                                help="number of bootstrap replicates for the confidence intervals")
+    compute_parser.add_argument("--no-stats", action="store_true",
+                                help="do not calculate the frame statistics, existing stats files are left as is")
+    compute_parser.add_argument("--studies", nargs="+", help="only calculate these studies")
+    compute_parser.add_argument("--output", help="where to save the result, defaults to ./result")
+    compute_parser.set_defaults(func=compute)
+
+    merge_parser = subparsers.add_parser("merge", help="merge periodicity results")
+    merge_parser.add_argument("output", help="path of the merged result, its studies are kept if it exists")
+    merge_parser.add_argument("inputs", nargs="+", help="paths of the results to be merged")
+    merge_parser.set_defaults(func=merge)
+
+    plot_parser = subparsers.add_parser("plot", help="graph the periodicity results")
+    add_species_and_QC(plot_parser)
+    plot_parser.add_argument("--level", choices=["study", "sample"], default="study")
+    plot_parser.add_argument("--threshold", type=float, default=2,
+                             help="threshold used to separate the periodicity into patterns")
+    plot_parser.add_argument("--num-cols", type=int, default=15, help="number of columns of the study level pdf")
+    plot_parser.set_defaults(func=plot)
+
+    return parser
+
+
+
+### main
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
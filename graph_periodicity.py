@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 import json
 import numpy as np
 import itertools
@@ -97,6 +96,9 @@ def graph_periodicity_study_level(data, num_cols, threshold, supertitle):
     supertitle (str)
         Title of the entire pdf graph
     """
+    # matplotlib is slow to import, only import it when plotting
+    import matplotlib.pyplot as plt
+
     # gets the periodicty value and separation index needed for plotting
     periodicty_data, separation_index = get_periodicity_study_level(data, threshold)
     first_type, second_type = separation_index[0], separation_index[1]
@@ -233,6 +235,8 @@ def graph_periodicity_sample_level(species_list, QC_results, threshold):
     threshold (int/float)
         Threshold value which used to separate the periodicty result into different patterns 
     """
+    import matplotlib.pyplot as plt
+
     # generate the plot and its subplots, final pdf size is 5 x 8 inches
     fig, axes = plt.subplots(4, 1, figsize=(5, 8))
 
@@ -308,24 +312,45 @@ def graph_periodicity_sample_level(species_list, QC_results, threshold):
 
 
 
-### main
+def graph_periodicity_all_studies(species_list, QC_results, num_cols, threshold):
+    """
+    Graphs the periodicty data from ./result at the study level for every species and QC status
 
-species_list = ["human", "mouse"]
-QC_results = ["_passed_", "_failed_"]
+    Parameters
+    ----------
+    species_list (array (str))
+        Array of the species within the RiboBase
+    QC_results (array (str))
+        Array of the quality control statues of the samples
+    num_cols (int)
+        Number of columns in the final pdf
+    threshold (int/float)
+        Threshold value which used to separate the periodicty result into different patterns 
+    """
+    # need to alter font size for better display results
+    for species in species_list:
+        for QC in QC_results: 
+            title = species+QC+"studies_periodicity"
+            curr_data_path = f"./result/{species}{QC}periodicity.json"
+            with open(curr_data_path) as j_file: 
+                data = json.load(j_file)
+
+            graph_periodicity_study_level(data, num_cols, threshold, title)
+
+
+
+### main
 
-## study level
+# ensures the graphs are only generated when ran as a script
+if __name__ == "__main__":
+    species_list = ["human", "mouse"]
+    QC_results = ["_passed_", "_failed_"]
 
-# need to alter font size for better display results
-for species in species_list:
-    for QC in QC_results: 
-        title = species+QC+"studies_periodicity"
-        curr_data_path = f"./result/{species}{QC}periodicity.json"
-        with open(curr_data_path) as j_file: 
-            data = json.load(j_file)
+    ## study level
 
-        graph_periodicity_study_level(data, 15, 2, title)
+    graph_periodicity_all_studies(species_list, QC_results, 15, 2)
 
 
-## sample level 
+    ## sample level 
 
-# graph_periodicity_sample_level(species_list, QC_results, 2)
+    # graph_periodicity_sample_level(species_list, QC_results, 2)
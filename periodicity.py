@@ -1,13 +1,11 @@
-import ribopy
 import multiprocessing
-import threading
-import time
 import numpy as np
-import pandas as pd
 import os
 import json
 import sys
 
+from result_files import get_stats_file_path
+
 
 def periodicity_per_transcript(coverage):
     """
@@ -32,10 +30,184 @@ def periodicity_per_transcript(coverage):
 
 
 
+def reference_cds_coverages(coverage, start_and_stop):
+    """
+    Get the CDS coverage of every transcript kept by the reference engine, in the same order as
+    coverage; the transcripts with a CDS length not divisible by 3 or without coverage are skipped
+
+    Parameters
+    ----------
+    coverage (dict)
+        ribo_object coverage data for one read length, maps transcript to its coverage array
+    start_and_stop (dict)
+        Contains the start and stop site for each gene's CDS region
+
+    Returns
+    -------
+    generator of the kept CDS coverage arrays
+    """
+    for transcript in coverage.keys():
+        cds_coverage = coverage[transcript][start_and_stop[transcript][0]:start_and_stop[transcript][1]]
+        if sum(cds_coverage) != 0 and cds_coverage.size % 3 == 0:
+            yield cds_coverage
+
+
+
+def periodicity_per_read_length(coverage, start_and_stop):
+    """
+    Reference engine: sum up the periodicity of every transcript's CDS region for a read length
+
+    Parameters
+    ----------
+    coverage (dict)
+        ribo_object coverage data for one read length, maps transcript to its coverage array
+    start_and_stop (dict)
+        Contains the start and stop site for each gene's CDS region
+
+    Returns
+    -------
+    read_length_periodicity (array)
+        type is integer, length is 3
+    """
+    read_length_periodicity = [0,0,0]
+    # iterate through the transcripts to sum up the read counts
+    for cds_coverage in reference_cds_coverages(coverage, start_and_stop):
+        count_per_transcript = periodicity_per_transcript(cds_coverage)
+        read_length_periodicity = [x + y for x, y in zip(read_length_periodicity, count_per_transcript)]
+    return read_length_periodicity
+
+
+
+def frame_matrix(coverage, start_and_stop):
+    """
+    Get the per-transcript periodicity counts for a read length as a single matrix. Only the
+    transcripts with a CDS length divisible by 3 and non-zero coverage (summed as int64, see the
+    known difference in ./benchmark/compare_engines.py) are included, in the same order as coverage
+
+    Parameters
+    ----------
+    coverage (dict)
+        ribo_object coverage data for one read length, maps transcript to its coverage array
+    start_and_stop (dict)
+        Contains the start and stop site for each gene's CDS region
+
+    Returns
+    -------
+    matrix (np.ndarray)
+        type is int64, shape is (number of kept transcripts, 3)
+    """
+    # one row per transcript, so the extra memory is only number of transcripts x 3
+    rows = []
+    for transcript, transcript_coverage in coverage.items():
+        start, stop = start_and_stop[transcript][0], start_and_stop[transcript][1]
+        cds_coverage = transcript_coverage[start:stop]
+        if cds_coverage.size != 0 and cds_coverage.size % 3 == 0:
+            rows.append(cds_coverage.reshape(-1, 3).sum(axis=0, dtype=np.int64))
+    if not rows:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    matrix = np.array(rows)
+    return matrix[matrix.sum(axis=1) != 0]
+
+
+
+def periodicity_per_read_length_vectorized(coverage, start_and_stop):
+    """
+    Vectorized engine: same result as periodicity_per_read_length, computed from frame_matrix
+
+    Parameters
+    ----------
+    coverage (dict)
+        ribo_object coverage data for one read length, maps transcript to its coverage array
+    start_and_stop (dict)
+        Contains the start and stop site for each gene's CDS region
+
+    Returns
+    -------
+    read_length_periodicity (array)
+        type is integer, length is 3
+    """
+    return [int(x) for x in frame_matrix(coverage, start_and_stop).sum(axis=0)]
+
+
+
+def frame_statistics(matrix, num_bootstrap=1000, confidence=0.95, seed=0, chunk_size=100):
+    """
+    Get the frame fractions of a read length along with their bootstrap confidence intervals.
+    Transcripts (rows of the frame matrix) are resampled with replacement, not reads. Each
+    bootstrap replicate is turned into per-transcript weights, so a chunk of replicates is a
+    single matrix product and memory stays bounded by chunk_size x number of transcripts
+
+    Parameters
+    ----------
+    matrix (np.ndarray)
+        Per-transcript periodicity counts from frame_matrix
+    num_bootstrap (int)
+        Number of bootstrap replicates
+    confidence (float)
+        Confidence level of the intervals
+    seed (int)
+        Seed for the random number generator
+    chunk_size (int)
+        Number of bootstrap replicates drawn at once
+
+    Returns
+    -------
+    statistics (dict)
+        "num_transcripts" (int), "frame_fractions", "ci_lower" and "ci_upper" (float arrays of
+        length 3, in frame order)
+    """
+    if num_bootstrap < 1:
+        raise ValueError(f"num_bootstrap must be at least 1, got {num_bootstrap}")
+
+    num_transcripts = matrix.shape[0]
+    total = matrix.sum(axis=0)
+    if num_transcripts == 0 or total.sum() == 0:
+        return {
+            "num_transcripts": num_transcripts,
+            "frame_fractions": [0.0, 0.0, 0.0],
+            "ci_lower": [0.0, 0.0, 0.0],
+            "ci_upper": [0.0, 0.0, 0.0],
+        }
+
+    rng = np.random.default_rng(seed)
+    replicates = np.empty((num_bootstrap, 3))
+    for chunk_start in range(0, num_bootstrap, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, num_bootstrap)
+        num_replicates = chunk_stop - chunk_start
+        # count how often each transcript is drawn in each replicate
+        drawn = rng.integers(0, num_transcripts, size=(num_replicates, num_transcripts))
+        drawn += (np.arange(num_replicates) * num_transcripts)[:, None]
+        weights = np.bincount(drawn.ravel(), minlength=num_replicates * num_transcripts)
+        counts = weights.reshape(num_replicates, num_transcripts) @ matrix
+        replicates[chunk_start:chunk_stop] = counts / counts.sum(axis=1, keepdims=True)
+
+    alpha = (1 - confidence) / 2
+    ci_lower, ci_upper = np.quantile(replicates, [alpha, 1 - alpha], axis=0)
+    return {
+        "num_transcripts": num_transcripts,
+        "frame_fractions": (total / total.sum()).tolist(),
+        "ci_lower": ci_lower.tolist(),
+        "ci_upper": ci_upper.tolist(),
+    }
+
+
+
+# engines that can be used by get_periodicity, they must return identical results
+# (checked by ./benchmark/compare_engines.py)
+ENGINES = {
+    "reference": periodicity_per_read_length,
+    "vectorized": periodicity_per_read_length_vectorized,
+}
+
+
+
 # get the total periodicity for a study
-def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock):
+def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock, engine="reference",
+                    stats_dict=None, num_bootstrap=1000):
     """
-    Calculate the total periodicity for a study; saves the result into result_dict
+    Calculate the total periodicity for a study; saves the result into result_dict and, if given,
+    the frame fractions and their confidence intervals into stats_dict
 
     Parameters
     ----------
@@ -49,7 +221,18 @@ def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock):
         The periodicity result
     lock (manager.Lock)
         Global lock used to prevent possible race conditions
+    engine (str)
+        Name of the engine in ENGINES used to sum up the periodicity of a read length
+    stats_dict (manager.dict)
+        The frame statistics result, not calculated if None
+    num_bootstrap (int)
+        Number of bootstrap replicates used for the confidence intervals
     """
+    # with fork, already imported by compute_periodicity and this only looks it up
+    import ribopy
+
+    periodicity_per_read_length_engine = ENGINES[engine]
+
     # set up file path
     study_path = os.path.join(os.getcwd(), "ribobase/"+study+"/ribo/experiments")
 
@@ -72,6 +255,7 @@ def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock):
         return None
 
     result = dict()
+    stats = dict()
     for ribo_file in ribo_files:
         exp_path = os.path.join(study_path, ribo_file)
         exp_name = ribo_file[:-5]
@@ -86,8 +270,8 @@ def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock):
             continue
 
         result[exp_name] = dict()
+        stats[exp_name] = dict()
         for read_length in range(start_length, stop_length + 1):
-            read_length_periodicity = [0,0,0]
             # create ribo object and get coverage data for the curr read length, human ribo files
             # can use its alias for simplicity
             # human
@@ -104,16 +288,19 @@ def get_periodicity(study, dynamic_range, start_and_stop, result_dict, lock):
                 range_lower=read_length,
                 range_upper=read_length
             )
-            # iterate through the transcripts to sum up the read counts
-            for transcript in curr_coverage.keys():
-                cds_coverage = curr_coverage[transcript][study_start_and_stop[transcript][0]:study_start_and_stop[transcript][1]]
-                if sum(cds_coverage) != 0 and cds_coverage.size % 3 == 0:
-                    count_per_transcript = periodicity_per_transcript(cds_coverage)
-                    read_length_periodicity = [x + y for x, y in zip(read_length_periodicity, count_per_transcript)]
-            
+            if stats_dict is not None:
+                matrix = frame_matrix(curr_coverage, study_start_and_stop)
+                stats[exp_name][read_length] = frame_statistics(matrix, num_bootstrap)
+            if stats_dict is not None and engine == "vectorized":
+                # the vectorized engine only sums up the frame matrix, reuse it
+                read_length_periodicity = [int(x) for x in matrix.sum(axis=0)]
+            else:
+                read_length_periodicity = periodicity_per_read_length_engine(curr_coverage, study_start_and_stop)
             result[exp_name][read_length] = read_length_periodicity
     with lock: # lock may not be needed, but just for safety
         result_dict[study] = result
+        if stats_dict is not None:
+            stats_dict[study] = stats
         # with open("./result/human_failed_periodicity.json", 'w') as json_f: 
         #     temp_final_result = dict(result_dict)
         #     json.dump(temp_final_result, json_f, indent=4)
@@ -160,6 +347,141 @@ def convert_to_regular_dict(manager_dict):
 
 
 
+def compute_periodicity(species, QC, main_manager, manager_lock, engine="reference", num_bootstrap=1000,
+                        studies=None, output_file_path=None, compute_stats=True):
+    """
+    Calculate the periodicity for the studies of a species and QC status, one process per study.
+    Studies already in the output file (and the stats file, if compute_stats) are skipped; saves
+    the result and the frame statistics as .json files
+
+    Parameters
+    ----------
+    species (str)
+        The species, ex. "human"
+    QC (str)
+        The QC status, ex. "_passed_"
+    main_manager (manager.Manager)
+        Manager used to create the shared dictionaries
+    manager_lock (manager.Lock)
+        Global lock used to prevent possible race conditions
+    engine (str)
+        Name of the engine in ENGINES used to sum up the periodicity of a read length
+    num_bootstrap (int)
+        Number of bootstrap replicates used for the confidence intervals
+    studies (array (str))
+        Only calculate these studies of the studies list, all studies if None
+    output_file_path (str)
+        Where to save the result, defaults to ./result/{species}{QC}periodicity.json. The frame
+        statistics are saved next to it with the _stats.json suffix
+    compute_stats (bool)
+        Whether to calculate the frame statistics, turning it off also keeps studies that are only
+        missing from the stats file from being recalculated
+    """
+    if compute_stats and num_bootstrap < 1:
+        print(f"Error: The number of bootstrap replicates must be at least 1, got {num_bootstrap}")
+        sys.exit(1)
+
+    print(species, QC)
+    if output_file_path is None:
+        output_file_path = f"./result/{species}{QC}periodicity.json"
+    stats_file_path = get_stats_file_path(output_file_path)
+    
+    # loading in dynamic range
+    dynamic_range_dir = os.path.join(os.getcwd(), "dynamic_range")
+    with open(os.path.join(dynamic_range_dir, species+QC+"dynamic_range.json"), 'r') as j_file:
+        dynamic_range = json.load(j_file)  
+
+    # loading in start and stop sites
+    start_stop_dir = os.path.join(os.getcwd(), "start_stop_sites")
+    with open(os.path.join(start_stop_dir, species+"_start_stop.json"), 'r') as j_file:
+        start_stop = json.load(j_file)
+
+    studies_list_path = os.path.join(os.getcwd(), "studies_lists")
+    with open(os.path.join(studies_list_path, "studies.json"), 'r') as j_file:
+        studies_lists = json.load(j_file)
+    
+    # Create shared dictionaries
+    manager_dynamic_range = main_manager.dict()
+    manager_start_and_stop = main_manager.dict()
+
+    # converting to manager.dict() so they are shared between all processes
+    # saves memory and faster performance
+    manager_dynamic_range = convert_to_managed_dict(dynamic_range, main_manager)
+    manager_start_and_stop = convert_to_managed_dict(start_stop, main_manager)
+
+    ## used for running on TACC
+
+    if os.path.exists(output_file_path):
+        with open(output_file_path, 'r') as j_file: 
+            saved_result = json.load(j_file)
+        manager_result = convert_to_managed_dict(saved_result, main_manager)
+    else:
+        manager_result = main_manager.dict()
+
+    if not compute_stats:
+        manager_stats = None
+    elif os.path.exists(stats_file_path):
+        with open(stats_file_path, 'r') as j_file: 
+            saved_stats = json.load(j_file)
+        manager_stats = convert_to_managed_dict(saved_stats, main_manager)
+    else:
+        manager_stats = main_manager.dict()
+
+    # import ribopy once in the parent, kept out of the module so scripts that only import this
+    # module stay fast. This only helps with the fork start method (the default on Linux), where the
+    # processes share it instead of each importing it again; with spawn (macOS, Windows) every
+    # process still imports it in get_periodicity
+    import ribopy  # noqa: F401
+
+    processes = []
+
+    curr_studies_lists = studies_lists[species+QC]
+    if studies is not None:
+        curr_studies_lists = [study for study in curr_studies_lists if study in studies]
+    # # # generate a process to calculate periodicity for each study
+    try:
+        for study in curr_studies_lists: 
+            if study not in manager_result or (compute_stats and study not in manager_stats):
+                p = multiprocessing.Process(
+                    target=get_periodicity,
+                    args=(
+                        study, 
+                        manager_dynamic_range, 
+                        manager_start_and_stop, 
+                        manager_result, 
+                        manager_lock,
+                        engine,
+                        manager_stats,
+                        num_bootstrap
+                    ), 
+                    name=study
+                )
+                processes.append(p)
+                p.start()
+    except Exception as e:
+        print(f'Error: Creating processes encountered this error: {e}')
+        # Terminate processes
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        sys.exit(1)    
+
+    # waiting for every process to finish
+    for p in processes:
+        p.join()
+    
+    # save final result
+    final_result = convert_to_regular_dict(manager_result)
+    with open(output_file_path, 'w') as json_f: 
+        json.dump(final_result, json_f, indent=4)
+    if compute_stats:
+        final_stats = convert_to_regular_dict(manager_stats)
+        with open(stats_file_path, 'w') as json_f: 
+            json.dump(final_stats, json_f, indent=4)
+
+
+
 ### Main
 
 # ensures this is only ran once
@@ -169,83 +491,17 @@ if __name__ == "__main__":
     manager_lock = main_manager.Lock()
     species_list = ["human", "mouse"]
     QC_results = ["_passed_", "_failed_"]
+    # engine used to sum up the periodicity, see ENGINES
+    engine = "reference"
+    # number of bootstrap replicates for the frame statistics' confidence intervals
+    num_bootstrap = 1000
+    # whether to calculate the frame statistics
+    compute_stats = True
 
     for species in species_list:
         for QC in QC_results: 
-            print(species, QC)
-            output_file_path = f"./result/{species}{QC}periodicity.json"
-            
-            # loading in dynamic range
-            dynamic_range_dir = os.path.join(os.getcwd(), "dynamic_range")
-            with open(os.path.join(dynamic_range_dir, species+QC+"dynamic_range.json"), 'r') as j_file:
-                dynamic_range = json.load(j_file)  
-
-            # loading in start and stop sites
-            start_stop_dir = os.path.join(os.getcwd(), "start_stop_sites")
-            with open(os.path.join(start_stop_dir, species+"_start_stop.json"), 'r') as j_file:
-                start_stop = json.load(j_file)
-
-            studies_list_path = os.path.join(os.getcwd(), "studies_lists")
-            with open(os.path.join(studies_list_path, "studies.json"), 'r') as j_file:
-                studies_lists = json.load(j_file)
-            
-            # Create shared dictionaries
-            manager_dynamic_range = main_manager.dict()
-            manager_start_and_stop = main_manager.dict()
-
-            # converting to manager.dict() so they are shared between all processes
-            # saves memory and faster performance
-            manager_dynamic_range = convert_to_managed_dict(dynamic_range, main_manager)
-            manager_start_and_stop = convert_to_managed_dict(start_stop, main_manager)
-
-        ## used for running on TACC
-
-            if os.path.exists(output_file_path):
-                with open(output_file_path, 'r') as j_file: 
-                    saved_result = json.load(j_file)
-                manager_result = convert_to_managed_dict(saved_result, main_manager)
-            else:
-                manager_result = main_manager.dict()
-
-            processes = []
-
-            curr_studies_lists = studies_lists[species+QC]
-            # # # generate a process to calculate periodicity for each study
-            try:
-                for study in curr_studies_lists: 
-                    if study not in manager_result:
-                        p = multiprocessing.Process(
-                            target=get_periodicity,
-                            args=(
-                                study, 
-                                manager_dynamic_range, 
-                                manager_start_and_stop, 
-                                manager_result, 
-                                manager_lock
-                            ), 
-                            name=study
-                        )
-                        processes.append(p)
-                        p.start()
-            except Exception as e:
-                print(f'Error: Creating processes encountered this error: {e}')
-                # Terminate processes
-                for p in processes:
-                    if p.is_alive():
-                        p.terminate()
-                        p.join()
-                sys.exit(1)    
-
-            # waiting for every process to finish
-            for p in processes:
-                p.join()
-            
-            # save final result
-            final_result = convert_to_regular_dict(manager_result)
-            with open(output_file_path, 'w') as json_f: 
-                json.dump(final_result, json_f, indent=4)
-
-
+            compute_periodicity(
+                species, QC, main_manager, manager_lock, engine, num_bootstrap, compute_stats=compute_stats
+            )
 
     main_manager.shutdown()
-
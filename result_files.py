@@ -0,0 +1,20 @@
+import os
+
+"""
+Helpers for the result files in ./result shared by periodicity.py and cli.py. This module must only
+import the standard library, so `cli.py merge` stays fast.
+"""
+
+
+
+def get_stats_file_path(output_file_path):
+    """
+    Get the path of the frame statistics saved next to a periodicity result,
+    ex. "./result/human_passed_periodicity.json" -> "./result/human_passed_periodicity_stats.json"
+
+    Parameters
+    ----------
+    output_file_path (str)
+        Path of the periodicity result
+    """
+    return os.path.splitext(output_file_path)[0] + "_stats.json"